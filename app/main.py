@@ -1,3 +1,5 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -6,15 +8,29 @@ import uvicorn
 
 from app.routers import analyze
 from app.routers import llm_router
+from app.services.summarizer import warm_up_summarizer
+from app.utils.http_client import http_client
+from app.utils.job_store import job_store
 
 # Create output directory if it doesn't exist
 os.makedirs("output", exist_ok=True)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up the summarizer before serving and release shared resources on shutdown"""
+    # Load the model and run a first generate call off the event loop, so the
+    # first analysis request does not pay the cold-start cost
+    await asyncio.to_thread(warm_up_summarizer)
+    yield
+    await http_client.aclose()
+    await job_store.close()
+
 # Create FastAPI app
 app = FastAPI(
     title="Social Media Comment Analyzer",
     description="API for extracting and analyzing comments from Instagram and YouTube",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
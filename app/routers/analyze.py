@@ -1,21 +1,18 @@
 # app/routers/analyze.py
 from fastapi import APIRouter, BackgroundTasks, HTTPException
 from pydantic import BaseModel, HttpUrl
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 import os
 from datetime import datetime
-import json
 
 from app.services import instagram, youtube
-from app.services.comment_analyzer import analyze_comments
+from app.services.comment_analyzer import analyze_comments, analyze_comment_pages
 from app.utils.file_manager import save_output_files
-from app.utils.url_parser import get_platform_from_url
+from app.utils.job_store import job_store
+from app.utils.url_parser import get_platform_from_url, extract_youtube_video_id
 
 router = APIRouter(prefix="/api", tags=["analyze"])
 
-# In-memory storage for tracking analysis jobs
-analysis_jobs = {}
-
 # Request/Response Models
 class URLRequest(BaseModel):
     url: HttpUrl
@@ -26,6 +23,35 @@ class AnalysisResponse(BaseModel):
     file_urls: Optional[Dict[str, str]] = None
     error: Optional[str] = None
 
+async def _analyze_youtube(url: str) -> Tuple[List[Dict[str, Any]], Dict[str, Any], Dict[str, Any]]:
+    """
+    Fetch YouTube comments page by page and analyze each page while later pages download
+    
+    Returns:
+        Tuple of (enriched comments, video metadata, analysis results)
+    """
+    metadata = {'Platform': 'YouTube'}
+    fetch_error = None
+    
+    async def pages():
+        nonlocal metadata, fetch_error
+        try:
+            async for page, metadata in youtube.iter_comment_pages(url):
+                yield page
+        except Exception as e:
+            # Same error record as youtube.extract_data
+            fetch_error = {'Platform': 'YouTube', 'Video ID': extract_youtube_video_id(url), 'Error': str(e)}
+            raise
+    
+    try:
+        analysis_results = await analyze_comment_pages(pages())
+    except Exception:
+        if fetch_error is None:
+            raise
+        return [], fetch_error, {}
+    
+    return analysis_results.get("processed_comments", []), metadata, analysis_results
+
 # Background task to process URLs
 async def process_url(request_id: str, url: str):
     try:
@@ -34,20 +60,19 @@ async def process_url(request_id: str, url: str):
         
         if platform == "Instagram":
             comments, metadata = await instagram.extract_metadata(url)
+            analysis_results = await analyze_comments(comments) if comments else {}
         elif platform == "YouTube":
-            comments, metadata = await youtube.extract_data(url)
+            # Pages are analyzed as they arrive rather than after the last download
+            comments, metadata, analysis_results = await _analyze_youtube(url)
         else:
-            analysis_jobs[request_id] = {
+            await job_store.set(request_id, {
                 "status": "failed",
                 "error": "Unsupported URL. Only Instagram and YouTube are supported."
-            }
+            })
             return
         
-        # If we have comments, perform advanced analysis
+        # If we have comments, add the analysis results
         if comments:
-            # Run the comment analyzer
-            analysis_results = await analyze_comments(comments)
-            
             # Update comments with enriched data from analysis
             if "processed_comments" in analysis_results:
                 comments = analysis_results["processed_comments"]
@@ -60,39 +85,33 @@ async def process_url(request_id: str, url: str):
             if "aspect_summaries" in analysis_results:
                 metadata["AspectSummaries"] = analysis_results["aspect_summaries"]
         
-        # Save files
-        file_urls = save_output_files(request_id, comments, metadata, platform)
-        
-        # Save insights as JSON file
-        if comments and "insights" in metadata:
-            insights_file = f"{platform.lower()}_insights_{request_id}.json"
-            insights_path = os.path.join("output", file_urls.get("folder", ""), insights_file)
-            
-            with open(insights_path, 'w', encoding='utf-8') as f:
-                json.dump(metadata.get("Insights", {}), f, indent=2)
-            
-            file_urls["insights_json"] = f"/api/files/{file_urls.get('folder', '')}/{insights_file}"
+        # Save files, including the insights JSON when analysis produced insights
+        insights = metadata.get("Insights") if comments and "Insights" in metadata else None
+        file_urls = await save_output_files(request_id, comments, metadata, platform, insights)
         
         # Update job status
-        analysis_jobs[request_id] = {
+        await job_store.set(request_id, {
             "status": "completed",
             "file_urls": file_urls,
             "comment_count": len(comments),
             "platform": platform,
             "folder": file_urls.get("folder", "")
-        }
+        })
         
     except Exception as e:
-        analysis_jobs[request_id] = {
+        await job_store.set(request_id, {
             "status": "failed",
             "error": str(e)
-        }
+        })
 
 @router.post("/analyze", response_model=AnalysisResponse)
 async def analyze_url(url_request: URLRequest, background_tasks: BackgroundTasks):
     """Submit a URL for analysis"""
     request_id = f"req_{datetime.now().strftime('%Y%m%d%H%M%S')}_{os.urandom(3).hex()}"
     
+    # Register the job so status checks from any worker can find it
+    await job_store.set(request_id, {"status": "processing"})
+    
     # Start background processing
     background_tasks.add_task(process_url, request_id, str(url_request.url))
     
@@ -105,11 +124,10 @@ async def analyze_url(url_request: URLRequest, background_tasks: BackgroundTasks
 @router.get("/status/{request_id}", response_model=AnalysisResponse)
 async def check_status(request_id: str):
     """Check the status of a submitted URL analysis"""
-    if request_id not in analysis_jobs:
+    job = await job_store.get(request_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Analysis job not found")
     
-    job = analysis_jobs[request_id]
-    
     response = AnalysisResponse(
         request_id=request_id,
         status=job.get("status", "processing")
@@ -1,35 +1,131 @@
 # app/services/absa.py
 from transformers import pipeline, AutoModelForSequenceClassification, AutoTokenizer
 import torch
-from typing import List, Dict, Any, Tuple
+import numpy as np
+from typing import List, Dict, Any, Tuple, Optional
 import re
+from functools import lru_cache
+
+from app.services.sentiment import MAX_INPUT_CHARS, MAX_TOKENS, get_sentiment_analyzer
+from app.utils.batching import MicroBatcher
+from app.utils.cache import LRUCache, text_key
+from app.utils.precision import USE_ONNX_RUNTIME, inference_dtype
+
+# Aspect categories for social media comments
+ASPECTS = [
+    "content", "quality", "presenter", "visuals", "audio", 
+    "length", "editing", "information", "entertainment", "product",
+    "service", "responsiveness", "value", "shipping", "usability"
+]
+
+# Related terms that also indicate an aspect is being discussed
+ASPECT_SYNONYMS = {
+    "content": ("material", "subject", "topic", "substance"),
+    "quality": ("resolution", "hd", "4k", "clarity"),
+    "presenter": ("speaker", "host", "creator", "youtuber", "influencer"),
+    "visuals": ("graphics", "visual", "picture", "image", "scene"),
+    "audio": ("sound", "music", "voice", "volume", "mic"),
+    "length": ("duration", "time", "short", "long"),
+    "editing": ("cuts", "transitions", "effects", "post-production"),
+    "information": ("info", "educational", "informative", "facts"),
+    "entertainment": ("funny", "enjoyable", "entertaining", "fun", "humor"),
+    "product": ("item", "device", "thing", "stuff", "merchandise"),
+    "service": ("customer service", "support", "help", "assistance"),
+}
+
+# Every keyword (aspect names and synonyms) mapped to its aspect
+_KEYWORD_TO_ASPECT: Dict[str, str] = {
+    keyword: aspect for aspect, keywords in ASPECT_SYNONYMS.items() for keyword in keywords
+} | {aspect: aspect for aspect in ASPECTS}
+
+# All keywords in a single pattern. The zero-width lookahead lets matches
+# overlap, so this finds the same substrings as checking each keyword with
+# `in`, but in one pass over the text.
+_ASPECT_PATTERN = re.compile(
+    "(?=(" + "|".join(map(re.escape, sorted(_KEYWORD_TO_ASPECT, key=len, reverse=True))) + "))"
+)
+
+def extract_aspects(text: str) -> List[str]:
+    """
+    Extract mentioned aspects from text
+    
+    Args:
+        text: Input comment text
+        
+    Returns:
+        List of aspects found in the text
+    """
+    # Simple keyword-based aspect extraction
+    matched = {_KEYWORD_TO_ASPECT[m.group(1)]
+               for m in _ASPECT_PATTERN.finditer(text.lower())}
+    
+    # Keep results in the declared aspect order
+    return [aspect for aspect in ASPECTS if aspect in matched]
+
+def general_aspect_result(sentiment: str, score: float) -> Dict[str, Any]:
+    """
+    Build the ABSA result for a comment that mentions no specific aspect
+    
+    The comment's overall sentiment stands in for the "general" aspect, so
+    the ABSA model does not need to run for it.
+    """
+    return {
+        "overall_sentiment": sentiment,
+        "aspects": {
+            "general": {
+                "sentiment": sentiment,
+                "score": score
+            }
+        }
+    }
+
+# Sentiment for each output class of the ABSA model (negative, neutral, positive)
+_ABSA_LABELS = np.array(["Negative", "Neutral", "Positive"])
 
 class AspectBasedSentimentAnalyzer:
-    def __init__(self, model_name: str = "yangheng/deberta-v3-base-absa-v1.1"):
+    def __init__(self, model_name: str = "yangheng/deberta-v3-base-absa-v1.1",
+                 batch_size: int = 64, cache_size: int = 100_000,
+                 use_onnx: bool = USE_ONNX_RUNTIME):
         """
         Initialize the Aspect-Based Sentiment Analysis (ABSA) service
         
         Args:
             model_name: The name of the Hugging Face model to use for ABSA
+            batch_size: Maximum number of (comment, aspect) pairs per forward pass
+            cache_size: Number of per-comment results kept to skip re-analyzing duplicates
+            use_onnx: Export the model to ONNX and run it with ONNX Runtime
         """
         # Use GPU if available
         self.device = 0 if torch.cuda.is_available() else -1
+        self.batch_size = batch_size
         
         print(f"Loading ABSA model: {model_name}")
         # For ABSA, we'll need a more specialized pipeline setup
         self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModelForSequenceClassification.from_pretrained(model_name)
-        
-        # Move model to the appropriate device
-        if self.device >= 0:
-            self.model = self.model.to(self.device)
+        if use_onnx:
+            from optimum.onnxruntime import ORTModelForSequenceClassification
+            
+            self.model = ORTModelForSequenceClassification.from_pretrained(
+                model_name,
+                export=True,
+                provider="CUDAExecutionProvider" if self.device >= 0 else "CPUExecutionProvider"
+            )
+        else:
+            self.model = AutoModelForSequenceClassification.from_pretrained(
+                model_name,
+                torch_dtype=inference_dtype(self.device),
+                low_cpu_mem_usage=True
+            )
+            
+            # Move model to the appropriate device
+            if self.device >= 0:
+                self.model = self.model.to(self.device)
         
         # Define aspect categories for social media comments
-        self.aspects = [
-            "content", "quality", "presenter", "visuals", "audio", 
-            "length", "editing", "information", "entertainment", "product",
-            "service", "responsiveness", "value", "shipping", "usability"
-        ]
+        self.aspects = ASPECTS
+        
+        # Results keyed by a hash of the comment text, shared by all callers
+        self.cache = LRUCache(cache_size)
         print("ABSA model loaded successfully")
     
     def extract_aspects(self, text: str) -> List[str]:
@@ -42,36 +138,50 @@ class AspectBasedSentimentAnalyzer:
         Returns:
             List of aspects found in the text
         """
-        # Simple keyword-based aspect extraction
-        found_aspects = []
-        text_lower = text.lower()
+        return extract_aspects(text)
+    
+    def _predict(self, pairs: List[Tuple[str, str]]) -> List[Tuple[str, float]]:
+        """
+        Run the ABSA model over (text, aspect) pairs in padded batches
+        
+        Args:
+            pairs: List of (comment_text, aspect) tuples
+            
+        Returns:
+            List of (sentiment_label, confidence_score) in the same order as pairs
+        """
+        if not pairs:
+            return []
         
-        for aspect in self.aspects:
-            # Check if aspect or related terms are in the text
-            if aspect in text_lower or self._get_aspect_synonyms(aspect, text_lower):
-                found_aspects.append(aspect)
+        chunk_scores = []
+        chunk_label_ids = []
         
-        return found_aspects
-    
-    def _get_aspect_synonyms(self, aspect: str, text: str) -> bool:
-        """Check for synonyms of aspects in the text"""
-        synonyms = {
-            "content": ["material", "subject", "topic", "substance"],
-            "quality": ["resolution", "hd", "4k", "clarity"],
-            "presenter": ["speaker", "host", "creator", "youtuber", "influencer"],
-            "visuals": ["graphics", "visual", "picture", "image", "scene"],
-            "audio": ["sound", "music", "voice", "volume", "mic"],
-            "length": ["duration", "time", "short", "long"],
-            "editing": ["cuts", "transitions", "effects", "post-production"],
-            "information": ["info", "educational", "informative", "facts"],
-            "entertainment": ["funny", "enjoyable", "entertaining", "fun", "humor"],
-            "product": ["item", "device", "thing", "stuff", "merchandise"],
-            "service": ["customer service", "support", "help", "assistance"],
-        }
+        for start in range(0, len(pairs), self.batch_size):
+            chunk = pairs[start:start + self.batch_size]
+            
+            # Encode each comment and aspect as a sentence pair. Only the comment
+            # is truncated, so the aspect always survives the length limit.
+            texts = [text[:MAX_INPUT_CHARS] for text, _ in chunk]
+            aspects = [aspect for _, aspect in chunk]
+            
+            # Tokenize the whole chunk at once, padding to the longest pair
+            inputs = self.tokenizer(texts, aspects, return_tensors="pt", padding=True,
+                                    truncation="only_first", max_length=MAX_TOKENS)
+            if self.device >= 0:
+                inputs = {k: v.to(self.device) for k, v in inputs.items()}
+            
+            # Get model outputs, keeping the winning class and its probability on device
+            with torch.inference_mode():
+                outputs = self.model(**inputs)
+                scores, label_ids = torch.softmax(outputs.logits.float(), dim=1).max(dim=1)
+            chunk_scores.append(scores)
+            chunk_label_ids.append(label_ids)
         
-        if aspect in synonyms:
-            return any(syn in text for syn in synonyms[aspect])
-        return False
+        # Copy all results to the host in one transfer and map class ids to labels
+        scores = torch.cat(chunk_scores).cpu().numpy()
+        labels = _ABSA_LABELS[torch.cat(chunk_label_ids).cpu().numpy()]
+        
+        return list(zip(labels.tolist(), scores.tolist()))
     
     def analyze_aspect_sentiment(self, text: str, aspect: str) -> Tuple[str, float]:
         """
@@ -85,88 +195,130 @@ class AspectBasedSentimentAnalyzer:
             Tuple of (sentiment_label, confidence_score)
         """
         try:
-            # Format input for aspect-based sentiment analysis
-            input_text = f"{text} [SEP] {aspect}"
-            
-            # Tokenize input
-            inputs = self.tokenizer(input_text, return_tensors="pt", truncation=True, max_length=512)
-            if self.device >= 0:
-                inputs = {k: v.to(self.device) for k, v in inputs.items()}
-            
-            # Get model outputs
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-                predictions = torch.softmax(outputs.logits, dim=1)
-                
-            # Extract results (most ABSA models use 3 classes: negative, neutral, positive)
-            sentiment_score = predictions.detach().cpu().numpy()[0]
-            
-            # Map to sentiment label
-            sentiment_id = sentiment_score.argmax()
-            if sentiment_id == 0:
-                sentiment = "Negative"
-                score = sentiment_score[0]
-            elif sentiment_id == 1:
-                sentiment = "Neutral"
-                score = sentiment_score[1]
-            else:
-                sentiment = "Positive"
-                score = sentiment_score[2]
-            
-            return sentiment, float(score)
+            return self._predict([(text, aspect)])[0]
         except Exception as e:
             print(f"Error in aspect sentiment analysis: {e}")
             return "Neutral", 0.5
     
-    def analyze_comment(self, text: str) -> Dict[str, Any]:
+    def _overall_sentiment(self, aspects: Dict[str, Dict[str, Any]]) -> Optional[str]:
+        """Calculate overall sentiment based on aspect sentiments"""
+        if not aspects:
+            return None
+        
+        positive_count = sum(1 for a in aspects.values() if a["sentiment"] == "Positive")
+        negative_count = sum(1 for a in aspects.values() if a["sentiment"] == "Negative")
+        
+        if positive_count > negative_count:
+            return "Positive"
+        elif negative_count > positive_count:
+            return "Negative"
+        return "Neutral"
+    
+    def batch_analyze(self, texts: List[str],
+                      aspects: Optional[List[List[str]]] = None) -> List[Dict[str, Any]]:
         """
-        Perform full aspect-based sentiment analysis on a comment
+        Perform aspect-based sentiment analysis on a batch of comments
+        
+        All (comment, aspect) pairs across the batch are scored together, so
+        the model runs once per chunk of pairs rather than once per pair.
+        Repeated texts and texts seen in earlier batches are served from the
+        cache.
         
         Args:
-            text: Comment text to analyze
+            texts: List of comment texts to analyze
+            aspects: Aspects already found in each text by extract_aspects; they
+                are looked up here when omitted
             
         Returns:
-            Dictionary with aspects and their sentiments
+            List of dictionaries with aspects and their sentiments, one per text
         """
-        results = {
-            "overall_sentiment": None,
-            "aspects": {}
-        }
+        keys = [text_key(text) for text in texts]
+        if aspects is None:
+            aspects = [None] * len(texts)
         
-        # Find aspects in the text
-        found_aspects = self.extract_aspects(text)
+        # Collect each distinct text that is not cached yet
+        results = {}
+        misses = {}
+        for key, text, found in zip(keys, texts, aspects):
+            if key in results or key in misses:
+                continue
+            cached = self.cache.get(key)
+            if cached is not None:
+                results[key] = cached
+            else:
+                misses[key] = (text, found)
         
-        # If no aspects found, add "general" aspect
-        if not found_aspects:
-            found_aspects = ["general"]
+        if misses:
+            # Find aspects in texts that came without them, falling back to a "general" aspect
+            text_aspects = [
+                (found if found is not None else self.extract_aspects(text)) or ["general"]
+                for text, found in misses.values()
+            ]
+            pairs = [(text, aspect) for (text, _), found in zip(misses.values(), text_aspects)
+                     for aspect in found]
+            
+            try:
+                predictions = self._predict(pairs)
+                cacheable = True
+            except Exception as e:
+                print(f"Error in batch aspect sentiment analysis: {e}")
+                predictions = [("Neutral", 0.5)] * len(pairs)
+                cacheable = False
+            
+            # Scatter the flat predictions back to per-comment results
+            position = 0
+            for key, found_aspects in zip(misses, text_aspects):
+                aspects = {}
+                for aspect in found_aspects:
+                    sentiment, score = predictions[position]
+                    position += 1
+                    aspects[aspect] = {
+                        "sentiment": sentiment,
+                        "score": score
+                    }
+                
+                results[key] = {
+                    "overall_sentiment": self._overall_sentiment(aspects),
+                    "aspects": aspects
+                }
+                if cacheable:
+                    self.cache.set(key, results[key])
         
-        # Analyze sentiment for each aspect
-        for aspect in found_aspects:
-            sentiment, score = self.analyze_aspect_sentiment(text, aspect)
-            results["aspects"][aspect] = {
-                "sentiment": sentiment,
-                "score": score
-            }
+        return [results[key] for key in keys]
+    
+    def analyze_comment(self, text: str) -> Dict[str, Any]:
+        """
+        Perform full aspect-based sentiment analysis on a comment
         
-        # Calculate overall sentiment based on aspect sentiments
-        if results["aspects"]:
-            positive_count = sum(1 for a in results["aspects"].values() if a["sentiment"] == "Positive")
-            negative_count = sum(1 for a in results["aspects"].values() if a["sentiment"] == "Negative")
+        Args:
+            text: Comment text to analyze
             
-            if positive_count > negative_count:
-                results["overall_sentiment"] = "Positive"
-            elif negative_count > positive_count:
-                results["overall_sentiment"] = "Negative"
-            else:
-                results["overall_sentiment"] = "Neutral"
+        Returns:
+            Dictionary with aspects and their sentiments
+        """
+        # Without a specific aspect the plain sentiment model already has the answer
+        found = extract_aspects(text)
+        if not found:
+            return general_aspect_result(*get_sentiment_analyzer().analyze(text))
         
-        return results
+        return self.batch_analyze([text], [found])[0]
+
+@lru_cache(maxsize=None)
+def get_absa_analyzer() -> AspectBasedSentimentAnalyzer:
+    """
+    Return the shared ABSA analyzer, loading the model on first use
+    """
+    return AspectBasedSentimentAnalyzer()
 
-# Create a singleton instance
-absa_analyzer = AspectBasedSentimentAnalyzer()
+# Merges batch_analyze calls from concurrent requests into shared ABSA forward passes.
+# Items are (text, aspects found in it) pairs.
+absa_batcher = MicroBatcher(
+    lambda items: get_absa_analyzer().batch_analyze([text for text, _ in items],
+                                                    [found for _, found in items])
+)
 
 def analyze_comment_aspects(text: str) -> Dict[str, Any]:
     """
     Compatibility function with the API
     """
-    return absa_analyzer.analyze_comment(text)
\ No newline at end of file
+    return get_absa_analyzer().analyze_comment(text)
\ No newline at end of file
@@ -1,21 +1,78 @@
 # app/services/comment_analyzer.py
-from typing import List, Dict, Any, Optional
 import asyncio
-import concurrent.futures
+from typing import List, Dict, Any, Optional, AsyncIterator
 from datetime import datetime
 
-from app.services.sentiment import sentiment_analyzer
-from app.services.aspect_analysis import absa_analyzer
-from app.services.summarizer import comment_summarizer
+from app.services.sentiment import SentimentAnalyzer, get_sentiment_analyzer, sentiment_batcher
+from app.services.aspect_analysis import (
+    AspectBasedSentimentAnalyzer, get_absa_analyzer, absa_batcher,
+    extract_aspects, general_aspect_result
+)
+from app.services.summarizer import CommentSummarizer, get_comment_summarizer, summary_batcher
+from app.utils.text_cleaner import normalize_comment_text
 
 class CommentAnalyzer:
     """
     Main service that orchestrates the entire comment analysis process
     """
-    def __init__(self):
-        self.sentiment_analyzer = sentiment_analyzer
-        self.absa_analyzer = absa_analyzer
-        self.comment_summarizer = comment_summarizer
+    @property
+    def comment_summarizer(self) -> CommentSummarizer:
+        """Shared comment summarizer, loaded on first use"""
+        return get_comment_summarizer()
+    
+    @property
+    def sentiment_analyzer(self) -> SentimentAnalyzer:
+        """Shared sentiment analyzer, loaded on first use"""
+        return get_sentiment_analyzer()
+    
+    @property
+    def absa_analyzer(self) -> AspectBasedSentimentAnalyzer:
+        """Shared ABSA analyzer, loaded on first use"""
+        return get_absa_analyzer()
+    
+    async def enrich_comments(self, comments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Add sentiment and aspect-based sentiment to comments
+        
+        Args:
+            comments: List of comment dictionaries
+            
+        Returns:
+            Copies of the comments with 'Sentiment', 'Sentiment_Score' and 'aspects' set
+        """
+        if not comments:
+            return []
+        
+        # Normalize comment texts once; every model below reads this version
+        comment_texts = [normalize_comment_text(c.get('Comment', '')) for c in comments]
+        
+        # Run the batched inferences one after the other: both models share the
+        # same device, so running them concurrently would only contend for it.
+        # The batchers merge these texts with those of other in-flight requests.
+        sentiment_results = await sentiment_batcher.submit(comment_texts)
+        
+        # Only comments that mention an aspect need the ABSA model; the rest
+        # reuse their overall sentiment for a "general" aspect
+        text_aspects = [extract_aspects(text) for text in comment_texts]
+        aspect_indices = [i for i, found in enumerate(text_aspects) if found]
+        aspect_results = await absa_batcher.submit(
+            [(comment_texts[i], text_aspects[i]) for i in aspect_indices]
+        )
+        
+        absa_results = [general_aspect_result(sentiment, score) for sentiment, score in sentiment_results]
+        for i, result in zip(aspect_indices, aspect_results):
+            absa_results[i] = result
+        
+        # Combine sentiment and ABSA results with comments (one result per comment)
+        return [
+            {
+                **comment,
+                'Sentiment': sentiment,
+                'Sentiment_Score': score,
+                'aspects': absa.get('aspects', {})
+            }
+            for comment, (sentiment, score), absa in zip(comments, sentiment_results, absa_results)
+        ]
     
     async def process_comments(self, comments: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
@@ -34,57 +91,67 @@ class CommentAnalyzer:
             }
         
         start_time = datetime.now()
+        enriched_comments = await self.enrich_comments(comments)
+        return await self._summarize_results(enriched_comments, start_time)
+    
+    async def process_comment_pages(self, pages: AsyncIterator[List[Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        Process comments that arrive in pages, enriching each page while later pages download
         
-        # Extract comment texts for processing
-        comment_texts = [c.get('Comment', '') for c in comments]
-        
-        # Run all analyses in parallel using a thread pool
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            # Run basic sentiment analysis on all comments
-            sentiment_future = executor.submit(
-                self._batch_analyze_sentiment, comment_texts
-            )
-            
-            # Run aspect-based sentiment analysis
-            absa_future = executor.submit(
-                self._batch_analyze_aspects, comment_texts
-            )
-            
-            # Wait for all tasks to complete
-            sentiment_results = sentiment_future.result()
-            absa_results = absa_future.result()
-        
-        # Combine sentiment and ABSA results with comments
-        enriched_comments = []
-        for i, comment in enumerate(comments):
-            enriched_comment = comment.copy()
-            
-            # Add basic sentiment analysis
-            if i < len(sentiment_results):
-                sentiment, score = sentiment_results[i]
-                enriched_comment['Sentiment'] = sentiment
-                enriched_comment['Sentiment_Score'] = score
-            
-            # Add aspect-based analysis
-            if i < len(absa_results):
-                enriched_comment['aspects'] = absa_results[i].get('aspects', {})
+        Args:
+            pages: Async iterator of comment dictionary lists
             
-            enriched_comments.append(enriched_comment)
+        Returns:
+            Dictionary with all analysis results, as from process_comments
+        """
+        start_time = datetime.now()
         
-        # Generate summaries and insights
-        insights = self.comment_summarizer.generate_insight_summary(enriched_comments)
+        page_tasks = []
+        try:
+            async for page in pages:
+                if page:
+                    page_tasks.append(asyncio.create_task(self.enrich_comments(page)))
+        except BaseException:
+            for task in page_tasks:
+                task.cancel()
+            await asyncio.gather(*page_tasks, return_exceptions=True)
+            raise
+        
+        # Summaries need the whole comment set, so they start once every page is enriched
+        enriched_comments = [comment for page in await asyncio.gather(*page_tasks) for comment in page]
+        if not enriched_comments:
+            return {
+                "error": "No comments to analyze",
+                "timestamp": datetime.now().isoformat()
+            }
+        return await self._summarize_results(enriched_comments, start_time)
+    
+    async def _summarize_results(self, enriched_comments: List[Dict[str, Any]],
+                                 start_time: datetime) -> Dict[str, Any]:
+        """Generate insights and aspect summaries for enriched comments and assemble the results"""
+        # Collect every summary this job needs and queue them as one request; the
+        # summary batcher merges it with other jobs' requests into shared generate calls
+        insight_inputs, insight_statistics = self.comment_summarizer.insight_summary_inputs(enriched_comments)
         
         # Generate aspect-specific summaries if we have enough comments
-        aspect_summaries = {}
-        if len(comments) >= 10:
+        aspect_inputs = {}
+        if len(enriched_comments) >= 10:
             all_aspects = set()
-            for result in absa_results:
-                all_aspects.update(result.get('aspects', {}).keys())
+            for comment in enriched_comments:
+                all_aspects.update(comment['aspects'].keys())
             
-            aspect_summaries = self.comment_summarizer.summarize_by_aspect(
+            aspect_inputs = self.comment_summarizer.aspect_summary_inputs(
                 enriched_comments, list(all_aspects)
             )
         
+        summaries = await summary_batcher.submit(
+            list(insight_inputs.values()) + list(aspect_inputs.values())
+        )
+        insights = self.comment_summarizer.build_insights(
+            dict(zip(insight_inputs, summaries)), insight_statistics
+        )
+        aspect_summaries = dict(zip(aspect_inputs, summaries[len(insight_inputs):]))
+        
         # Calculate processing time
         processing_time = (datetime.now() - start_time).total_seconds()
         
@@ -93,21 +160,10 @@ class CommentAnalyzer:
             "insights": insights,
             "aspect_summaries": aspect_summaries,
             "processing_time": processing_time,
-            "comment_count": len(comments),
+            "comment_count": len(enriched_comments),
             "timestamp": datetime.now().isoformat()
         }
     
-    def _batch_analyze_sentiment(self, texts: List[str]) -> List[Tuple]:
-        """Run batch sentiment analysis"""
-        return self.sentiment_analyzer.batch_analyze(texts)
-    
-    def _batch_analyze_aspects(self, texts: List[str]) -> List[Dict]:
-        """Run batch aspect-based sentiment analysis"""
-        results = []
-        for text in texts:
-            results.append(self.absa_analyzer.analyze_comment(text))
-        return results
-
 # Create a singleton instance
 comment_analyzer = CommentAnalyzer()
 
@@ -121,4 +177,16 @@ async def analyze_comments(comments: List[Dict[str, Any]]) -> Dict[str, Any]:
     Returns:
         Analysis results dictionary
     """
-    return await comment_analyzer.process_comments(comments)
\ No newline at end of file
+    return await comment_analyzer.process_comments(comments)
+
+async def analyze_comment_pages(pages: AsyncIterator[List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Public API function to analyze comments delivered page by page
+    
+    Args:
+        pages: Async iterator of comment dictionary lists
+        
+    Returns:
+        Analysis results dictionary
+    """
+    return await comment_analyzer.process_comment_pages(pages)
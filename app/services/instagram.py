@@ -1,9 +1,11 @@
 import instaloader
-import requests
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
 import os
-import time
+import asyncio
 
+import orjson
+
+from app.utils.http_client import http_client
 from app.utils.url_parser import extract_instagram_shortcode
 
 # Get access token from environment variables
@@ -14,6 +16,9 @@ APP_ID = os.environ.get('INSTAGRAM_APP_ID', 'YOUR_INSTAGRAM_APP_ID')
 INSTAGRAM_USERNAME = os.environ.get('INSTAGRAM_USERNAME', '')
 INSTAGRAM_PASSWORD = os.environ.get('INSTAGRAM_PASSWORD', '')
 
+# Maximum number of comment reply threads fetched at once when logged in
+REPLY_FETCH_CONCURRENCY = 8
+
 async def extract_metadata(post_url: str) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
     """Extract metadata and comments from Instagram post"""
     try:
@@ -23,7 +28,7 @@ async def extract_metadata(post_url: str) -> Tuple[List[Dict[str, Any]], Dict[st
         
         # First use instaloader to get basic post metadata
         L = instaloader.Instaloader()
-        post = instaloader.Post.from_shortcode(L.context, shortcode)
+        post = await asyncio.to_thread(instaloader.Post.from_shortcode, L.context, shortcode)
         
         # Extract post metadata
         post_metadata = {
@@ -68,10 +73,14 @@ async def fetch_comments_with_token(media_id: str) -> List[Dict[str, Any]]:
             "fields": "text,username,timestamp,like_count,id,replies{text,username,timestamp,like_count,id}"
         }
         
-        response = requests.get(url, params=params)
-        data = response.json()
-        
-        if 'data' in data:
+        # Follow the paging cursor until the last page
+        while url:
+            response = await http_client.get(url, params=params)
+            data = orjson.loads(response.content)
+            
+            if 'data' not in data:
+                break
+            
             for comment in data['data']:
                 # Add main comment
                 comment_data = {
@@ -99,6 +108,10 @@ async def fetch_comments_with_token(media_id: str) -> List[Dict[str, Any]]:
                             'IsReply': True
                         }
                         comments.append(reply_data)
+            
+            # The next page URL already carries the access token, fields and cursor
+            url = data.get('paging', {}).get('next')
+            params = None
                 
         return comments
     except Exception as e:
@@ -107,51 +120,58 @@ async def fetch_comments_with_token(media_id: str) -> List[Dict[str, Any]]:
 
 async def fetch_comments_with_login(L: instaloader.Instaloader, post: instaloader.Post) -> List[Dict[str, Any]]:
     """Fetch comments using username and password login"""
-    comments = []
-    
     try:
-        # Login to Instagram
+        # Login to Instagram (instaloader is blocking, so keep it off the event loop)
         print(f"Trying to login with username {INSTAGRAM_USERNAME}")
-        L.login(INSTAGRAM_USERNAME, INSTAGRAM_PASSWORD)
+        await asyncio.to_thread(L.login, INSTAGRAM_USERNAME, INSTAGRAM_PASSWORD)
         print("Login successful")
         
         # Sleep to avoid rate limiting after login
-        time.sleep(2)
+        await asyncio.sleep(2)
+        
+        # Fetch top-level comments, then their replies concurrently
+        top_level_comments = await asyncio.to_thread(list, post.get_comments())
+        semaphore = asyncio.Semaphore(REPLY_FETCH_CONCURRENCY)
+        replies = await asyncio.gather(
+            *(_fetch_replies(comment, semaphore) for comment in top_level_comments)
+        )
+        
+        comments = []
+        for comment, answers in zip(top_level_comments, replies):
+            comments.append(_login_comment_data(comment))
+            comments.extend(_login_comment_data(answer, parent_id=str(comment.id)) for answer in answers)
         
-        # Fetch comments
-        for comment in post.get_comments():
-            comment_data = {
-                'Comment': comment.text,
-                'Username': comment.owner.username,
-                'Platform': 'Instagram',
-                'Likes': 0,  # Instaloader doesn't provide like count for comments
-                'CommentId': str(comment.id),
-                'Timestamp': comment.created_at_utc.strftime('%Y-%m-%d %H:%M:%S'),
-                'IsReply': False
-            }
-            comments.append(comment_data)
-            
-            # Fetch replies
-            try:
-                for answer in comment.answers:
-                    reply_data = {
-                        'Comment': answer.text,
-                        'Username': answer.owner.username,
-                        'Platform': 'Instagram',
-                        'Likes': 0,  # Instaloader doesn't provide like count for replies
-                        'CommentId': str(answer.id),
-                        'ParentId': str(comment.id),
-                        'Timestamp': answer.created_at_utc.strftime('%Y-%m-%d %H:%M:%S'),
-                        'IsReply': True
-                    }
-                    comments.append(reply_data)
-            except Exception as e:
-                print(f"Error fetching replies for comment {comment.id}: {e}")
-                
-            # Throttle to avoid rate limits
-            time.sleep(0.5)
-                
         return comments
     except Exception as e:
         print(f"Error fetching Instagram comments with login: {e}")
-        return []
\ No newline at end of file
+        return []
+
+async def _fetch_replies(comment: instaloader.PostComment, semaphore: asyncio.Semaphore) -> List[instaloader.PostCommentAnswer]:
+    """
+    Fetch the replies to a comment, with at most REPLY_FETCH_CONCURRENCY
+    fetches in flight at once
+    
+    Requests are also paced by instaloader's own rate controller, so there
+    is no extra sleep between comments.
+    """
+    async with semaphore:
+        try:
+            return await asyncio.to_thread(list, comment.answers)
+        except Exception as e:
+            print(f"Error fetching replies for comment {comment.id}: {e}")
+            return []
+
+def _login_comment_data(comment: Any, parent_id: Optional[str] = None) -> Dict[str, Any]:
+    """Convert an instaloader comment or reply into a comment dictionary"""
+    comment_data = {
+        'Comment': comment.text,
+        'Username': comment.owner.username,
+        'Platform': 'Instagram',
+        'Likes': 0,  # Instaloader doesn't provide like count for comments
+        'CommentId': str(comment.id),
+        'Timestamp': comment.created_at_utc.strftime('%Y-%m-%d %H:%M:%S'),
+        'IsReply': parent_id is not None
+    }
+    if parent_id is not None:
+        comment_data['ParentId'] = parent_id
+    return comment_data
@@ -1,27 +1,77 @@
 # app/services/enhanced_sentiment.py
-from transformers import pipeline
+from transformers import pipeline, AutoTokenizer
 import torch
-from typing import Tuple, Dict, Any, List
-import os
+from typing import Tuple, Dict, Any, List, Optional
+from functools import lru_cache
+
+from app.utils.batching import MicroBatcher
+from app.utils.cache import LRUCache, text_key
+from app.utils.precision import USE_ONNX_RUNTIME, inference_dtype
+
+# Comments rarely exceed a few dozen tokens; longer inputs are truncated, and raw
+# text is clipped first so the tokenizer never scans very long spam
+MAX_TOKENS = 128
+MAX_INPUT_CHARS = 600
 
 class SentimentAnalyzer:
-    def __init__(self, model_name: str = "cardiffnlp/twitter-roberta-base-sentiment-latest"):
+    def __init__(self, model_name: str = "cardiffnlp/twitter-roberta-base-sentiment-latest",
+                 batch_size: Optional[int] = None, cache_size: int = 100_000,
+                 use_onnx: bool = USE_ONNX_RUNTIME):
         """
         Initialize the sentiment analyzer with the specified model
         
         Args:
             model_name: The name of the Hugging Face model to use for sentiment analysis
+            batch_size: Number of texts per forward pass (defaults to 32 on GPU, 1 on CPU)
+            cache_size: Number of per-text results kept to skip re-analyzing duplicates
+            use_onnx: Export the model to ONNX and run it with ONNX Runtime
         """
         # Use GPU if available
         self.device = 0 if torch.cuda.is_available() else -1
         
+        # Batching only pays off on GPU; on CPU padding overhead outweighs the gain
+        if batch_size is None:
+            batch_size = 32 if self.device >= 0 else 1
+        self.batch_size = batch_size
+        
         # Initialize the sentiment analysis pipeline
         print(f"Loading sentiment analysis model: {model_name}")
-        self.sentiment_analyzer = pipeline(
-            "sentiment-analysis",
-            model=model_name,
-            device=self.device
-        )
+        if use_onnx:
+            from optimum.onnxruntime import ORTModelForSequenceClassification
+            from optimum.pipelines import pipeline as ort_pipeline
+            
+            ort_model = ORTModelForSequenceClassification.from_pretrained(
+                model_name,
+                export=True,
+                provider="CUDAExecutionProvider" if self.device >= 0 else "CPUExecutionProvider"
+            )
+            self.sentiment_analyzer = ort_pipeline(
+                "sentiment-analysis",
+                model=ort_model,
+                tokenizer=AutoTokenizer.from_pretrained(model_name),
+                accelerator="ort",
+                device=self.device,
+                batch_size=self.batch_size,
+                truncation=True,
+                max_length=MAX_TOKENS,
+                padding=True
+            )
+        else:
+            self.sentiment_analyzer = pipeline(
+                "sentiment-analysis",
+                model=model_name,
+                device=self.device,
+                torch_dtype=inference_dtype(self.device),
+                batch_size=self.batch_size,
+                truncation=True,
+                max_length=MAX_TOKENS,
+                padding=True,
+                model_kwargs={"low_cpu_mem_usage": True}
+            )
+        self.tokenizer = self.sentiment_analyzer.tokenizer
+        
+        # Results keyed by a hash of the text, shared by all callers
+        self.cache = LRUCache(cache_size)
         print("Sentiment analysis model loaded successfully")
     
     def analyze(self, text: str) -> Tuple[str, float]:
@@ -39,8 +89,13 @@ class SentimentAnalyzer:
             if not text or len(text) < 3:
                 return "Neutral", 0.5
             
+            key = text_key(text)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+            
             # Get sentiment prediction
-            result = self.sentiment_analyzer(text)[0]
+            result = self.sentiment_analyzer(text[:MAX_INPUT_CHARS])[0]
             
             # Extract label and score
             label = result['label']
@@ -53,7 +108,8 @@ class SentimentAnalyzer:
                 sentiment = "Negative"
             else:
                 sentiment = "Neutral"
-                
+            
+            self.cache.set(key, (sentiment, score))
             return sentiment, score
         except Exception as e:
             print(f"Error analyzing sentiment: {e}")
@@ -63,6 +119,9 @@ class SentimentAnalyzer:
         """
         Analyze sentiment for a batch of texts
         
+        Repeated texts and texts seen in earlier batches are served from the
+        cache, so only unseen texts go through the model.
+        
         Args:
             texts: List of texts to analyze
             
@@ -70,47 +129,81 @@ class SentimentAnalyzer:
             List of tuples (sentiment_label, sentiment_score)
         """
         try:
-            # Filter out empty texts
-            valid_texts = [t for t in texts if t and len(t) >= 3]
-            if not valid_texts:
-                return [("Neutral", 0.5) for _ in texts]
-            
-            # Get batch predictions
-            results = self.sentiment_analyzer(valid_texts)
+            # Empty or very short texts get no key and default to Neutral
+            keys = [text_key(t) if t and len(t) >= 3 else None for t in texts]
             
-            # Map results
-            sentiments = []
-            result_index = 0
-            
-            for text in texts:
-                if not text or len(text) < 3:
-                    sentiments.append(("Neutral", 0.5))
+            # Collect each distinct text that is not cached yet
+            results = {}
+            misses = {}
+            for key, text in zip(keys, texts):
+                if key is None or key in results or key in misses:
+                    continue
+                cached = self.cache.get(key)
+                if cached is not None:
+                    results[key] = cached
                 else:
-                    result = results[result_index]
-                    result_index += 1
-                    
-                    label = result['label']
-                    score = result['score']
-                    
-                    if 'POSITIVE' in label or 'POS' in label:
-                        sentiment = "Positive"
-                    elif 'NEGATIVE' in label or 'NEG' in label:
-                        sentiment = "Negative"
-                    else:
-                        sentiment = "Neutral"
-                    
-                    sentiments.append((sentiment, score))
+                    misses[key] = text
+            
+            if misses:
+                predictions = self._predict(list(misses.values()))
+                for key, prediction in zip(misses, predictions):
+                    self.cache.set(key, prediction)
+                    results[key] = prediction
             
-            return sentiments
+            return [results[key] if key is not None else ("Neutral", 0.5) for key in keys]
         except Exception as e:
             print(f"Error in batch sentiment analysis: {e}")
             return [("Neutral", 0.5) for _ in texts]
+    
+    def _predict(self, texts: List[str]) -> List[Tuple[str, float]]:
+        """
+        Run the sentiment model over non-empty texts
+        
+        Args:
+            texts: List of texts to analyze
+            
+        Returns:
+            List of tuples (sentiment_label, sentiment_score) in input order
+        """
+        texts = [text[:MAX_INPUT_CHARS] for text in texts]
+        
+        # Sort by token length so each batch pads to a similar length
+        token_ids = self.tokenizer(texts, truncation=True, max_length=MAX_TOKENS)["input_ids"]
+        order = sorted(range(len(texts)), key=lambda i: len(token_ids[i]))
+        sorted_texts = [texts[i] for i in order]
+        
+        # Get batch predictions (the pipeline batches list inputs internally)
+        sorted_results = self.sentiment_analyzer(sorted_texts, batch_size=self.batch_size)
+        
+        # Undo the length sort and map results back onto the original positions
+        sentiments = [None] * len(texts)
+        for sorted_pos, original_pos in enumerate(order):
+            result = sorted_results[sorted_pos]
+            label = result['label']
+            
+            if 'POSITIVE' in label or 'POS' in label:
+                sentiment = "Positive"
+            elif 'NEGATIVE' in label or 'NEG' in label:
+                sentiment = "Negative"
+            else:
+                sentiment = "Neutral"
+            
+            sentiments[original_pos] = (sentiment, result['score'])
+        
+        return sentiments
+
+@lru_cache(maxsize=None)
+def get_sentiment_analyzer() -> SentimentAnalyzer:
+    """
+    Return the shared sentiment analyzer, loading the model on first use
+    """
+    return SentimentAnalyzer()
 
-# Create a singleton instance
-sentiment_analyzer = SentimentAnalyzer()
+# Merges batch_analyze calls from concurrent requests into shared sentiment forward passes
+sentiment_batcher = MicroBatcher(lambda texts: get_sentiment_analyzer().batch_analyze(texts))
 
 def analyze_sentiment(text: str) -> Tuple[str, float]:
     """
     Compatibility function with the original API
     """
-    return sentiment_analyzer.analyze(text)
\ No newline at end of file
+    return get_sentiment_analyzer().analyze(text)
\ No newline at end of file
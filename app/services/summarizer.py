@@ -1,33 +1,228 @@
 # app/services/summarization.py
-from transformers import pipeline
+from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
 import torch
-from typing import List, Dict, Any, Optional
+import os
+from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
 from collections import Counter
+from functools import lru_cache
+
+from app.utils.batching import MicroBatcher
+from app.utils.cache import LRUCache, text_key
+from app.utils.precision import USE_ONNX_RUNTIME, inference_dtype
+
+# Compile the summarizer's forward pass with torch.compile (GPU only)
+COMPILE_SUMMARIZER = os.environ.get('COMPILE_SUMMARIZER', '').lower() in ('1', 'true', 'yes')
+
+# Inputs longer than the model window are split into at most this many chunks
+MAX_CHUNKS = 8
+
+# Length limits for the intermediate per-chunk summaries, in tokens
+CHUNK_SUMMARY_MAX_LENGTH = 80
+CHUNK_SUMMARY_MIN_LENGTH = 20
+
+# Inputs shorter than this many characters are returned as they are; a model
+# summary of a couple of short comments is no shorter and usually worse
+MIN_SUMMARY_INPUT_CHARS = 200
 
 class CommentSummarizer:
-    def __init__(self, model_name: str = "facebook/bart-large-cnn"):
+    def __init__(self, model_name: str = "sshleifer/distilbart-cnn-12-6",
+                 compile_model: bool = COMPILE_SUMMARIZER,
+                 use_onnx: bool = USE_ONNX_RUNTIME, cache_size: int = 1024,
+                 generate_batch_size: int = 8):
         """
         Initialize the comment summarization service
         
         Args:
             model_name: The name of the Hugging Face model to use for summarization
+            compile_model: Compile the model's forward pass with torch.compile on GPU
+            use_onnx: Export the encoder and decoder to ONNX and run them with ONNX Runtime
+            cache_size: Number of summarized input texts kept to skip regenerating them
+            generate_batch_size: Maximum number of input texts per generate call
         """
         # Use GPU if available
         self.device = 0 if torch.cuda.is_available() else -1
         
         print(f"Loading summarization model: {model_name}")
-        self.summarizer = pipeline(
-            "summarization",
-            model=model_name,
-            device=self.device
-        )
+        # The Rust-backed fast tokenizer batches and pads without Python-level loops
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+        if use_onnx:
+            from optimum.onnxruntime import ORTModelForSeq2SeqLM
+            
+            self.model = ORTModelForSeq2SeqLM.from_pretrained(
+                model_name,
+                export=True,
+                provider="CUDAExecutionProvider" if self.device >= 0 else "CPUExecutionProvider"
+            )
+        else:
+            self.model = AutoModelForSeq2SeqLM.from_pretrained(
+                model_name,
+                torch_dtype=inference_dtype(self.device),
+                low_cpu_mem_usage=True
+            )
+            if self.device >= 0:
+                self.model = self.model.to(self.device)
+        
+        # Leave headroom below the position limit for special tokens and re-tokenization
+        self.max_input_tokens = self.model.config.max_position_embeddings - 64
+        
+        # Use the model's own summarization settings (beam search, length penalty, ...)
+        summarization_params = (self.model.config.task_specific_params or {}).get("summarization", {})
+        self.model.generation_config.update(**summarization_params)
+        
+        # Fuse the decoder step's kernels. Input and cache shapes change between
+        # calls, so the graph is compiled for dynamic shapes.
+        if compile_model and self.device >= 0 and not use_onnx:
+            self.model.forward = torch.compile(self.model.forward, dynamic=True)
+        
+        # Bound the padded batch so beam search over long windows fits in GPU memory
+        self.generate_batch_size = generate_batch_size
+        
+        # Summaries keyed by a hash of the input text and generation lengths
+        self.cache = LRUCache(cache_size)
         print("Summarization model loaded successfully")
     
+    def _generate(self, inputs: List[str], max_length: int, min_length: int,
+                  num_return_sequences: int = 1) -> List[str]:
+        """
+        Run the model's generate loop directly on input texts, generate_batch_size at a time
+        
+        Args:
+            inputs: Texts to summarize
+            max_length: Maximum length of each summary in tokens
+            min_length: Minimum length of each summary in tokens
+            num_return_sequences: Number of summaries to return per input
+            
+        Returns:
+            Generated summaries, num_return_sequences per input in input order
+        """
+        summaries = []
+        for start in range(0, len(inputs), self.generate_batch_size):
+            batch = inputs[start:start + self.generate_batch_size]
+            
+            encoded = self.tokenizer(batch, return_tensors="pt", padding=True, truncation=True)
+            if self.model.device.type == "cuda":
+                # Copy from page-locked memory so the host-to-device transfer runs asynchronously
+                encoded = {k: v.pin_memory().to(self.model.device, non_blocking=True)
+                           for k, v in encoded.items()}
+            else:
+                encoded = dict(encoded)
+            
+            with torch.inference_mode():
+                output_ids = self.model.generate(
+                    **encoded,
+                    max_length=max_length,
+                    min_length=min_length,
+                    num_return_sequences=num_return_sequences
+                )
+            
+            summaries.extend(self.tokenizer.batch_decode(output_ids, skip_special_tokens=True,
+                                                         clean_up_tokenization_spaces=True))
+        return summaries
+    
+    def _chunk_text(self, text: str) -> List[str]:
+        """
+        Split a text into consecutive windows that each fit the model input
+        
+        Only the first MAX_CHUNKS windows are returned; text beyond them is dropped.
+        """
+        # Only the first MAX_CHUNKS windows are kept, so don't tokenize far beyond them
+        text_limit = MAX_CHUNKS * self.max_input_tokens * 8
+        token_ids = self.tokenizer(text[:text_limit], add_special_tokens=False, verbose=False)["input_ids"]
+        if len(token_ids) <= self.max_input_tokens:
+            return [text]
+        
+        window = self.max_input_tokens
+        windows = [token_ids[i:i + window] for i in range(0, len(token_ids), window)][:MAX_CHUNKS]
+        return self.tokenizer.batch_decode(windows)
+    
+    def _summarize(self, inputs: List[str], max_length: int, min_length: int,
+                   num_return_sequences: int = 1, skip_model: bool = False) -> List[str]:
+        """
+        Summarize each input text, reusing cached summaries of texts seen before
+        
+        Args:
+            inputs: Texts to summarize
+            max_length: Maximum length of each summary in tokens
+            min_length: Minimum length of each summary in tokens
+            num_return_sequences: Number of summaries to return per input
+            skip_model: Return every input as its own summary instead of running the model
+            
+        Returns:
+            Generated summaries, num_return_sequences per input in input order
+        """
+        keys = [text_key(f"{max_length}\x1f{min_length}\x1f{num_return_sequences}\x1f{text}")
+                for text in inputs]
+        results = [
+            # Roughly max_length tokens' worth of characters
+            [text[:max_length * 5]] * num_return_sequences
+            if skip_model or len(text) < MIN_SUMMARY_INPUT_CHARS else self.cache.get(key)
+            for text, key in zip(inputs, keys)
+        ]
+        
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            summaries = self._chunk_and_summarize([inputs[i] for i in missing], max_length,
+                                                  min_length, num_return_sequences)
+            for n, i in enumerate(missing):
+                results[i] = summaries[n * num_return_sequences:(n + 1) * num_return_sequences]
+                self.cache.set(keys[i], results[i])
+        
+        return [summary for result in results for summary in result]
+    
+    def _chunk_and_summarize(self, inputs: List[str], max_length: int, min_length: int,
+                             num_return_sequences: int = 1) -> List[str]:
+        """
+        Summarize each input text, chunking and reducing texts that exceed the model window
+        
+        Every chunk of every long input is summarized in one pass, then the chunk
+        summaries of each input are joined and summarized together with the short
+        inputs in a second pass. Each pass runs in batches of generate_batch_size.
+        Inputs longer than MAX_CHUNKS windows keep only their first MAX_CHUNKS windows.
+        
+        Args:
+            inputs: Texts to summarize
+            max_length: Maximum length of each final summary in tokens
+            min_length: Minimum length of each final summary in tokens
+            num_return_sequences: Number of summaries to return per input
+            
+        Returns:
+            Generated summaries, num_return_sequences per input in input order
+        """
+        chunked = [self._chunk_text(text) for text in inputs]
+        
+        long_chunks = [chunk for chunks in chunked if len(chunks) > 1 for chunk in chunks]
+        chunk_summaries = []
+        if long_chunks:
+            chunk_summaries = self._generate(long_chunks,
+                                             max_length=CHUNK_SUMMARY_MAX_LENGTH,
+                                             min_length=CHUNK_SUMMARY_MIN_LENGTH)
+        
+        final_inputs = []
+        position = 0
+        for chunks in chunked:
+            if len(chunks) == 1:
+                final_inputs.append(chunks[0])
+            else:
+                final_inputs.append(" ".join(chunk_summaries[position:position + len(chunks)]))
+                position += len(chunks)
+        
+        return self._generate(final_inputs, max_length=max_length, min_length=min_length,
+                              num_return_sequences=num_return_sequences)
+    
+    def warm_up(self) -> None:
+        """
+        Run one small generate call so the first request does not pay for
+        CUDA initialization, kernel selection or torch.compile
+        """
+        self._generate(["Thanks for the video, the editing and the audio were great."],
+                       max_length=20, min_length=5)
+    
     def summarize_comments(self, comments: List[str], 
                           max_length: int = 150,
                           min_length: int = 30,
-                          summary_count: int = 1) -> List[str]:
+                          summary_count: int = 1,
+                          skip_model: bool = False) -> List[str]:
         """
         Generate summaries from a list of comments
         
@@ -36,6 +231,7 @@ class CommentSummarizer:
             max_length: Maximum length of the summary in tokens
             min_length: Minimum length of the summary in tokens
             summary_count: Number of summary variants to generate
+            skip_model: Return the combined comments instead of running the model
             
         Returns:
             List of generated summaries
@@ -44,28 +240,99 @@ class CommentSummarizer:
             if not comments:
                 return ["No comments to summarize."]
             
-            # Combine comments into a single text
-            combined_text = " ".join(comments)
-            
-            # Handle length constraints - BART models typically have a limit of 1024 tokens
-            # Simple truncation strategy - take first ~3000 chars
-            max_input_chars = 3000
-            if len(combined_text) > max_input_chars:
-                combined_text = combined_text[:max_input_chars]
+            combined_text = self._combine_comments(comments)
             
             # Generate summary
-            summaries = self.summarizer(
-                combined_text,
+            return self._summarize(
+                [combined_text],
                 max_length=max_length,
                 min_length=min_length,
-                num_return_sequences=summary_count
+                num_return_sequences=summary_count,
+                skip_model=skip_model
             )
-            
-            return [summary['summary_text'] for summary in summaries]
         except Exception as e:
             print(f"Error during summarization: {e}")
             return ["Could not generate summary due to an error."]
     
+    def summarize_batch(self, comment_groups: List[List[str]],
+                        max_length: int = 150,
+                        min_length: int = 30,
+                        skip_model: bool = False) -> List[str]:
+        """
+        Generate one summary per group of comments, batching the groups' generate calls
+        
+        If the batch fails, each group is retried on its own so that one failing
+        group (e.g. an input that runs out of memory) does not fail the others.
+        
+        Args:
+            comment_groups: List of comment lists, each summarized separately
+            max_length: Maximum length of each summary in tokens
+            min_length: Minimum length of each summary in tokens
+            skip_model: Return each group's combined comments instead of running the model
+            
+        Returns:
+            List of summaries, one per group
+        """
+        if not comment_groups:
+            return []
+        
+        inputs = [self._combine_comments(comments) for comments in comment_groups]
+        try:
+            # All groups share batched generate calls
+            return self._summarize(inputs, max_length=max_length, min_length=min_length,
+                                   skip_model=skip_model)
+        except Exception as e:
+            print(f"Error during batch summarization: {e}")
+            if len(inputs) == 1:
+                return ["Could not generate summary due to an error."]
+        
+        summaries = []
+        for text in inputs:
+            try:
+                summaries.extend(self._summarize([text], max_length=max_length,
+                                                 min_length=min_length, skip_model=skip_model))
+            except Exception as e:
+                print(f"Error during summarization: {e}")
+                summaries.append("Could not generate summary due to an error.")
+        return summaries
+    
+    def _combine_comments(self, comments: List[str]) -> str:
+        """Combine comments into a single text; long texts are chunked by _summarize"""
+        return " ".join(comments)
+    
+    def aspect_summary_inputs(self, comments: List[Dict[str, Any]],
+                              aspects: Optional[List[str]] = None) -> Dict[str, List[str]]:
+        """
+        Group comment texts by aspect for summarization
+        
+        Args:
+            comments: List of dictionaries containing comments with aspect analysis
+            aspects: Optional list of aspects to keep (all found aspects if None)
+            
+        Returns:
+            Dictionary mapping aspect names to their comment texts, for aspects
+            with enough comments to summarize
+        """
+        aspect_comments = {}
+        
+        for comment in comments:
+            comment_text = comment.get('Comment', '')
+            comment_aspects = comment.get('aspects', {})
+            
+            if not comment_aspects and not aspects:
+                # Add to general bucket if no aspects found
+                aspect_comments.setdefault('general', []).append(comment_text)
+                continue
+            
+            # Add comment to each aspect's bucket
+            for aspect_name in comment_aspects:
+                if aspects and aspect_name not in aspects:
+                    continue
+                aspect_comments.setdefault(aspect_name, []).append(comment_text)
+        
+        # Skip aspects with too few comments
+        return {aspect: texts for aspect, texts in aspect_comments.items() if len(texts) >= 3}
+    
     def summarize_by_aspect(self, comments: List[Dict[str, Any]], 
                            aspects: Optional[List[str]] = None) -> Dict[str, str]:
         """
@@ -79,38 +346,75 @@ class CommentSummarizer:
             Dictionary mapping aspect names to summaries
         """
         try:
-            # Group comments by aspect
-            aspect_comments = {}
-            
-            for comment in comments:
-                comment_text = comment.get('Comment', '')
-                comment_aspects = comment.get('aspects', {})
-                
-                if not comment_aspects and not aspects:
-                    # Add to general bucket if no aspects found
-                    aspect_comments.setdefault('general', []).append(comment_text)
-                    continue
-                
-                # Add comment to each aspect's bucket
-                for aspect_name in comment_aspects:
-                    if aspects and aspect_name not in aspects:
-                        continue
-                    aspect_comments.setdefault(aspect_name, []).append(comment_text)
-            
-            # Generate summaries for each aspect
-            aspect_summaries = {}
-            for aspect, texts in aspect_comments.items():
-                if len(texts) < 3:  # Skip if too few comments
-                    continue
-                summaries = self.summarize_comments(texts)
-                if summaries:
-                    aspect_summaries[aspect] = summaries[0]
+            aspect_comments = self.aspect_summary_inputs(comments, aspects)
+            summaries = self.summarize_batch(list(aspect_comments.values()))
             
-            return aspect_summaries
+            return dict(zip(aspect_comments, summaries))
         except Exception as e:
             print(f"Error in aspect-based summarization: {e}")
             return {"error": f"Summarization failed: {str(e)}"}
     
+    def insight_summary_inputs(self, comments: List[Dict[str, Any]]) -> Tuple[Dict[str, List[str]], Dict[str, Any]]:
+        """
+        Collect the comment groups to summarize and the statistics for an insights report
+        
+        Args:
+            comments: Non-empty list of comments with sentiment analysis
+            
+        Returns:
+            Tuple of (comment texts keyed by insight field, insight statistics)
+        """
+        # Bucket texts by sentiment and count sentiments and commenters in one pass
+        texts = []
+        positive_texts = []
+        negative_texts = []
+        sentiment_counts = Counter()
+        commenter_counts = Counter()
+        
+        texts_append = texts.append
+        positive_append = positive_texts.append
+        negative_append = negative_texts.append
+        
+        for c in comments:
+            text = c.get('Comment', '')
+            sentiment = c.get('Sentiment', 'Neutral')
+            texts_append(text)
+            if sentiment == 'Positive':
+                positive_append(text)
+            elif sentiment == 'Negative':
+                negative_append(text)
+            sentiment_counts[sentiment] += 1
+            commenter_counts[c.get('Username', 'Anonymous')] += 1
+        
+        # Calculate percentages
+        total = len(texts)
+        sentiment_percentages = {
+            k: round(v / total * 100, 1) for k, v in sentiment_counts.items()
+        }
+        
+        summary_inputs = {"overview": texts}
+        if len(positive_texts) >= 3:
+            summary_inputs["positive_summary"] = positive_texts
+        if len(negative_texts) >= 3:
+            summary_inputs["negative_summary"] = negative_texts
+        
+        statistics = {
+            "sentiment_distribution": sentiment_percentages,
+            "comment_count": total,
+            "top_commenters": commenter_counts.most_common(5)
+        }
+        return summary_inputs, statistics
+    
+    @staticmethod
+    def build_insights(summaries: Dict[str, str], statistics: Dict[str, Any]) -> Dict[str, Any]:
+        """Assemble an insights report from generated summaries and statistics"""
+        return {
+            "overview": summaries["overview"],
+            "positive_summary": summaries.get("positive_summary", ""),
+            "negative_summary": summaries.get("negative_summary", ""),
+            **statistics
+        }
+    
     def generate_insight_summary(self, comments: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
         Generate comprehensive insights summary from comments with sentiment data
@@ -125,60 +429,37 @@ class CommentSummarizer:
             if not comments:
                 return {"overview": "No comments to analyze"}
             
-            # Extract comment texts
-            texts = [c.get('Comment', '') for c in comments]
-            
-            # Get sentiment counts
-            sentiments = [c.get('Sentiment', 'Neutral') for c in comments]
-            sentiment_counts = Counter(sentiments)
-            
-            # Calculate percentages
-            total = len(sentiments)
-            sentiment_percentages = {
-                k: round(v / total * 100, 1) for k, v in sentiment_counts.items()
-            }
-            
-            # Get top commenters
-            usernames = [c.get('Username', 'Anonymous') for c in comments]
-            top_commenters = Counter(usernames).most_common(5)
-            
-            # Generate overall summary
-            overall_summary = self.summarize_comments(texts)[0]
-            
-            # Generate positive and negative summaries
-            positive_texts = [c.get('Comment', '') for c in comments 
-                             if c.get('Sentiment') == 'Positive']
-            negative_texts = [c.get('Comment', '') for c in comments 
-                             if c.get('Sentiment') == 'Negative']
-            
-            positive_summary = ""
-            negative_summary = ""
-            
-            if positive_texts and len(positive_texts) >= 3:
-                positive_summary = self.summarize_comments(positive_texts)[0]
-            
-            if negative_texts and len(negative_texts) >= 3:
-                negative_summary = self.summarize_comments(negative_texts)[0]
-            
-            return {
-                "overview": overall_summary,
-                "positive_summary": positive_summary,
-                "negative_summary": negative_summary,
-                "sentiment_distribution": sentiment_percentages,
-                "comment_count": total,
-                "top_commenters": top_commenters
-            }
+            summary_inputs, statistics = self.insight_summary_inputs(comments)
+            
+            # Generate all summaries in one batched call
+            summaries = dict(zip(summary_inputs, self.summarize_batch(list(summary_inputs.values()))))
+            
+            return self.build_insights(summaries, statistics)
         except Exception as e:
             print(f"Error generating insight summary: {e}")
             return {"error": f"Could not generate insights: {str(e)}"}
 
-# Create a singleton instance
-comment_summarizer = CommentSummarizer()
+@lru_cache(maxsize=None)
+def get_comment_summarizer() -> CommentSummarizer:
+    """
+    Return the shared comment summarizer, loading the model on first use
+    """
+    return CommentSummarizer()
+
+def warm_up_summarizer() -> None:
+    """Load the shared summarizer and run one generate call through it"""
+    get_comment_summarizer().warm_up()
+
+# Merges summarize_batch calls from concurrent requests into shared generate calls.
+# max_batch counts comment groups; GPU memory per call is bounded by the
+# summarizer's generate_batch_size, and summarize_batch isolates failing groups.
+summary_batcher = MicroBatcher(lambda groups: get_comment_summarizer().summarize_batch(groups),
+                               max_batch=32, max_wait_ms=5)
 
 def summarize_comments(comments: List[str]) -> List[str]:
     """Compatibility function with the API"""
-    return comment_summarizer.summarize_comments(comments)
+    return get_comment_summarizer().summarize_comments(comments)
 
 def generate_insights(comments: List[Dict[str, Any]]) -> Dict[str, Any]:
     """Compatibility function with the API for generating insights"""
-    return comment_summarizer.generate_insight_summary(comments)
\ No newline at end of file
+    return get_comment_summarizer().generate_insight_summary(comments)
\ No newline at end of file
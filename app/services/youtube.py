@@ -1,102 +1,139 @@
-import requests
+import asyncio
 import os
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional, AsyncIterator
 
+import orjson
+
+from app.utils.http_client import http_client
 from app.utils.url_parser import extract_youtube_video_id
 
 # Get API key from environment variable or use default
 API_KEY = os.environ.get('YOUTUBE_API_KEY', 'YOUR_YOUTUBE_API_KEY')
 
-async def extract_data(video_url: str) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
-    """Extract comments and metadata from YouTube video"""
-    video_id = extract_youtube_video_id(video_url)
-    
-    if not video_id:
-        return [], {'Platform': 'YouTube', 'Error': 'Invalid YouTube URL format'}
-    
-    # Get video metadata
-    video_info_url = f"https://www.googleapis.com/youtube/v3/videos?part=snippet,statistics&id={video_id}&key={API_KEY}"
-    try:
-        video_response = requests.get(video_info_url)
-        video_data = video_response.json()
-        
-        if 'items' in video_data and len(video_data['items']) > 0:
-            snippet = video_data['items'][0]['snippet']
-            statistics = video_data['items'][0]['statistics']
-            
-            video_metadata = {
-                'Platform': 'YouTube',
-                'Video ID': video_id,
-                'Title': snippet['title'],
-                'Description': snippet['description'],
-                'Published At': snippet['publishedAt'],
-                'Channel': snippet['channelTitle'],
-                'View Count': statistics.get('viewCount', 'N/A'),
-                'Like Count': statistics.get('likeCount', 'N/A'),
-                'Comment Count': statistics.get('commentCount', 'N/A'),
-                'Tags': ', '.join(snippet.get('tags', [])) if 'tags' in snippet else 'No tags'
-            }
-        else:
-            video_metadata = {
-                'Platform': 'YouTube',
-                'Video ID': video_id,
-                'Error': 'Could not retrieve video metadata'
-            }
-        
-        comments = []
-        next_page_token = None
+VIDEOS_URL = "https://www.googleapis.com/youtube/v3/videos"
+COMMENT_THREADS_URL = "https://www.googleapis.com/youtube/v3/commentThreads"
 
-        while True:
-            url = f"https://www.googleapis.com/youtube/v3/commentThreads?part=snippet,replies&videoId={video_id}&key={API_KEY}&maxResults=100"
-            if next_page_token:
-                url += f"&pageToken={next_page_token}"
+async def _get_json(url: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Send a GET request to the YouTube Data API and decode the JSON body"""
+    response = await http_client.get(url, params=params)
+    return orjson.loads(response.content)
 
-            response = requests.get(url)
-            data = response.json()
+async def _fetch_comment_page(video_id: str, page_token: Optional[str] = None) -> Dict[str, Any]:
+    """Fetch one page of comment threads (with replies) for a video"""
+    params = {
+        'part': 'snippet,replies',
+        'videoId': video_id,
+        'key': API_KEY,
+        'maxResults': 100
+    }
+    if page_token:
+        params['pageToken'] = page_token
+    return await _get_json(COMMENT_THREADS_URL, params)
 
-            if 'items' not in data:
-                if 'error' in data:
-                    print(f"API Error: {data['error']['message']}")
-                break
+def _video_metadata(video_id: str, video_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the metadata record from a videos API response"""
+    if 'items' in video_data and len(video_data['items']) > 0:
+        snippet = video_data['items'][0]['snippet']
+        statistics = video_data['items'][0]['statistics']
+        
+        return {
+            'Platform': 'YouTube',
+            'Video ID': video_id,
+            'Title': snippet['title'],
+            'Description': snippet['description'],
+            'Published At': snippet['publishedAt'],
+            'Channel': snippet['channelTitle'],
+            'View Count': statistics.get('viewCount', 'N/A'),
+            'Like Count': statistics.get('likeCount', 'N/A'),
+            'Comment Count': statistics.get('commentCount', 'N/A'),
+            'Tags': ', '.join(snippet.get('tags', [])) if 'tags' in snippet else 'No tags'
+        }
+    return {
+        'Platform': 'YouTube',
+        'Video ID': video_id,
+        'Error': 'Could not retrieve video metadata'
+    }
 
-            for item in data['items']:
-                # Process top-level comment
-                comment_snippet = item['snippet']['topLevelComment']['snippet']
-                text = ' '.join(comment_snippet['textDisplay'].splitlines())
-                comment_id = item['snippet']['topLevelComment']['id']
+def _page_comments(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Flatten one commentThreads page into comment records, replies after their parent"""
+    comments = []
+    for item in data['items']:
+        # Process top-level comment
+        comment_snippet = item['snippet']['topLevelComment']['snippet']
+        text = ' '.join(comment_snippet['textDisplay'].splitlines())
+        comment_id = item['snippet']['topLevelComment']['id']
 
+        comments.append({
+            'Username': comment_snippet['authorDisplayName'],
+            'Comment': text,
+            'Platform': 'YouTube',
+            'Likes': comment_snippet['likeCount'],
+            'CommentId': comment_id,
+            'IsReply': False,
+            'Timestamp': comment_snippet['publishedAt']
+        })
+        
+        # Process replies if any
+        if 'replies' in item and 'comments' in item['replies']:
+            for reply in item['replies']['comments']:
+                reply_snippet = reply['snippet']
+                reply_text = ' '.join(reply_snippet['textDisplay'].splitlines())
+                
                 comments.append({
-                    'Username': comment_snippet['authorDisplayName'],
-                    'Comment': text,
+                    'Username': reply_snippet['authorDisplayName'],
+                    'Comment': reply_text,
                     'Platform': 'YouTube',
-                    'Likes': comment_snippet['likeCount'],
-                    'CommentId': comment_id,
-                    'IsReply': False,
-                    'Timestamp': comment_snippet['publishedAt']
+                    'Likes': reply_snippet['likeCount'],
+                    'CommentId': reply['id'],
+                    'ParentId': comment_id,
+                    'IsReply': True,
+                    'Timestamp': reply_snippet['publishedAt']
                 })
-                
-                # Process replies if any
-                if 'replies' in item and 'comments' in item['replies']:
-                    for reply in item['replies']['comments']:
-                        reply_snippet = reply['snippet']
-                        reply_text = ' '.join(reply_snippet['textDisplay'].splitlines())
-                        
-                        comments.append({
-                            'Username': reply_snippet['authorDisplayName'],
-                            'Comment': reply_text,
-                            'Platform': 'YouTube',
-                            'Likes': reply_snippet['likeCount'],
-                            'CommentId': reply['id'],
-                            'ParentId': comment_id,
-                            'IsReply': True,
-                            'Timestamp': reply_snippet['publishedAt']
-                        })
+    return comments
+
+async def iter_comment_pages(video_url: str) -> AsyncIterator[Tuple[List[Dict[str, Any]], Dict[str, Any]]]:
+    """
+    Stream comments from a YouTube video one API page at a time
+
+    Yields:
+        Tuples of (comments on the page, video metadata). The metadata is the
+        same for every page; at least one tuple is always yielded.
+    """
+    video_id = extract_youtube_video_id(video_url)
+    
+    if not video_id:
+        yield [], {'Platform': 'YouTube', 'Error': 'Invalid YouTube URL format'}
+        return
+    
+    # Get video metadata and the first page of comments concurrently
+    video_data, data = await asyncio.gather(
+        _get_json(VIDEOS_URL, {'part': 'snippet,statistics', 'id': video_id, 'key': API_KEY}),
+        _fetch_comment_page(video_id)
+    )
+    video_metadata = _video_metadata(video_id, video_data)
+
+    # Each page's token comes from the previous response, so pages are fetched in order
+    while True:
+        if 'items' not in data:
+            if 'error' in data:
+                print(f"API Error: {data['error']['message']}")
+            yield [], video_metadata
+            return
+
+        yield _page_comments(data), video_metadata
 
-            next_page_token = data.get('nextPageToken')
-            if not next_page_token:
-                break
+        next_page_token = data.get('nextPageToken')
+        if not next_page_token:
+            return
+        data = await _fetch_comment_page(video_id, next_page_token)
 
+async def extract_data(video_url: str) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Extract comments and metadata from YouTube video"""
+    comments = []
+    try:
+        async for page, video_metadata in iter_comment_pages(video_url):
+            comments.extend(page)
         return comments, video_metadata
         
     except Exception as e:
-        return [], {'Platform': 'YouTube', 'Video ID': video_id, 'Error': str(e)}
\ No newline at end of file
+        return [], {'Platform': 'YouTube', 'Video ID': extract_youtube_video_id(video_url), 'Error': str(e)}
@@ -0,0 +1,86 @@
+import asyncio
+from typing import Any, Callable, List, Optional, Tuple
+
+class MicroBatcher:
+    """
+    Merge concurrent batch requests into shared calls of a batch function
+
+    Callers submit lists of items. A dispatcher coroutine waits briefly for
+    other requests to arrive, concatenates them into one batch, runs the
+    batch function once in a worker thread and hands each caller back its
+    own slice of the results.
+    """
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Any]],
+                 max_batch: int = 64, max_wait_ms: float = 10):
+        """
+        Initialize the batcher
+
+        Args:
+            batch_fn: Blocking function mapping a list of items to a list of results
+            max_batch: Stop waiting for more requests once this many items are queued
+            max_wait_ms: How long to wait for other requests before dispatching
+        """
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def submit(self, items: List[Any]) -> List[Any]:
+        """
+        Queue items for the next merged batch and wait for their results
+
+        Args:
+            items: Items to process
+
+        Returns:
+            Results for the submitted items, in order
+        """
+        if not items:
+            return []
+
+        self._ensure_dispatcher()
+        future = self._loop.create_future()
+        await self._queue.put((items, future))
+        return await future
+
+    def _ensure_dispatcher(self) -> None:
+        """Start the dispatcher on the running event loop if it is not running"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._dispatcher = None
+
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = loop.create_task(self._dispatch())
+
+    async def _dispatch(self) -> None:
+        """Drain queued requests into merged batches forever"""
+        while True:
+            requests: List[Tuple[List[Any], asyncio.Future]] = [await self._queue.get()]
+            size = len(requests[0][0])
+
+            # Give concurrent requests a moment to join this batch
+            if size < self.max_batch:
+                await asyncio.sleep(self.max_wait)
+            while size < self.max_batch and not self._queue.empty():
+                request = self._queue.get_nowait()
+                requests.append(request)
+                size += len(request[0])
+
+            items = [item for batch, _ in requests for item in batch]
+            try:
+                results = await asyncio.to_thread(self.batch_fn, items)
+            except Exception as e:
+                for _, future in requests:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            position = 0
+            for batch, future in requests:
+                if not future.done():
+                    future.set_result(results[position:position + len(batch)])
+                position += len(batch)
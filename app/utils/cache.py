@@ -0,0 +1,42 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+def text_key(text: str) -> str:
+    """Return a compact content hash to use as a cache key for a text"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+class LRUCache:
+    """
+    Thread-safe in-process least-recently-used cache
+    """
+    def __init__(self, maxsize: int = 100_000):
+        """
+        Initialize an empty cache
+
+        Args:
+            maxsize: Maximum number of entries kept before the oldest are evicted
+        """
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None if it is not cached"""
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key: str, value: Any) -> None:
+        """Store value under key, evicting the least recently used entry if full"""
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -1,17 +1,37 @@
 import os
-import csv
+import io
+import asyncio
 from datetime import datetime
-from typing import List, Dict, Any
-from collections import Counter
+from typing import List, Dict, Any, Optional, Union
 
-from app.services.sentiment import analyze_sentiment
+import aiofiles
+import orjson
+import pandas as pd
+
+from app.services.sentiment import sentiment_batcher
 
 # Output directory
 OUTPUT_DIR = "output"
 
-def save_output_files(request_id: str, comments: List[Dict[str, Any]], 
-                     metadata: Dict[str, Any], platform: str) -> Dict[str, str]:
-    """Save comments and metadata to files and return file URLs"""
+# Sentiment classes reported in the metadata file, in order
+SENTIMENT_LABELS = ['Positive', 'Neutral', 'Negative']
+
+# Columns of the comments CSV, in order
+COMMENT_COLUMNS = ['Username', 'Comment', 'Comment ID', 'Platform', 'Likes', 'Is Reply', 'Parent Comment ID']
+
+async def _write_file(path: str, content: Union[str, bytes]) -> None:
+    """Write content to a file without blocking the event loop"""
+    if isinstance(content, bytes):
+        async with aiofiles.open(path, 'wb') as file:
+            await file.write(content)
+    else:
+        async with aiofiles.open(path, 'w', newline='', encoding='utf-8') as file:
+            await file.write(content)
+
+async def save_output_files(request_id: str, comments: List[Dict[str, Any]], 
+                            metadata: Dict[str, Any], platform: str,
+                            insights: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+    """Save comments, metadata and optional insights to files and return file URLs"""
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     short_platform = 'insta' if platform == 'Instagram' else 'yt'
     
@@ -28,82 +48,101 @@ def save_output_files(request_id: str, comments: List[Dict[str, Any]],
     sentiment_path = os.path.join(response_dir, sentiment_csv)
     metadata_path = os.path.join(response_dir, metadata_txt)
     
-    # Calculate sentiment metrics
-    sentiments = []
-    for comment in comments:
-        sentiment, score = analyze_sentiment(comment['Comment'])
-        sentiments.append(sentiment)
+    # Score only the comments the analyzer has not already labelled, in one batch
+    unscored = [comment for comment in comments if 'Sentiment' not in comment]
+    results = await sentiment_batcher.submit([comment['Comment'] for comment in unscored])
+    for comment, (sentiment, score) in zip(unscored, results):
         comment['Sentiment'] = sentiment
         comment['Sentiment_Score'] = score
     
+    # Columnar table of the output fields, built in one pass over the comments.
+    # Object columns keep the values exactly as they are so the CSVs match the dicts.
+    frame = pd.DataFrame(
+        [
+            (
+                comment.get('Username', 'Anonymous'),
+                comment['Comment'],
+                comment.get('CommentId', ''),
+                comment['Platform'],
+                comment.get('Likes', 0),
+                'Yes' if comment.get('IsReply', False) else 'No',
+                comment.get('ParentId', '') if comment.get('IsReply', False) else 'Null',
+                comment.get('Sentiment', 'Neutral'),
+                comment.get('Sentiment_Score', 0.0)
+            )
+            for comment in comments
+        ],
+        columns=COMMENT_COLUMNS + ['Sentiment', 'Sentiment Score'],
+        dtype=object
+    )
+    
     # Get sentiment report
-    sentiment_counts = Counter(sentiments)
-    total_comments = len(comments)
-    sentiment_report = {
-        'Total Comments': total_comments,
-        'Positive': f"{sentiment_counts.get('Positive', 0)} ({sentiment_counts.get('Positive', 0)/total_comments*100:.1f}%)" if total_comments > 0 else "0 (0%)",
-        'Neutral': f"{sentiment_counts.get('Neutral', 0)} ({sentiment_counts.get('Neutral', 0)/total_comments*100:.1f}%)" if total_comments > 0 else "0 (0%)",
-        'Negative': f"{sentiment_counts.get('Negative', 0)} ({sentiment_counts.get('Negative', 0)/total_comments*100:.1f}%)" if total_comments > 0 else "0 (0%)"
-    }
+    total_comments = len(frame)
+    counts = frame['Sentiment'].value_counts().reindex(SENTIMENT_LABELS, fill_value=0).to_numpy()
+    percentages = counts / max(total_comments, 1) * 100
+    sentiment_report = {'Total Comments': total_comments}
+    if total_comments > 0:
+        sentiment_report.update(
+            (label, f"{count} ({percentage:.1f}%)")
+            for label, count, percentage in zip(SENTIMENT_LABELS, counts, percentages)
+        )
+    else:
+        sentiment_report.update((label, "0 (0%)") for label in SENTIMENT_LABELS)
     
-    # Get top commenters
-    if comments:
-        commenters = Counter([comment.get('Username', 'Anonymous') for comment in comments])
-        top_commenters = commenters.most_common(5)
-        top_commenters_list = [f"{username} ({count})" for username, count in top_commenters]
+    # Get top commenters, reusing the counts from the insights when they were computed;
+    # otherwise count them here with ties in first-appearance order, as Counter does
+    if insights is not None and 'top_commenters' in insights:
+        top_commenters = insights['top_commenters']
     else:
-        top_commenters_list = []
+        commenters = frame['Username'].value_counts(sort=False).sort_values(ascending=False, kind='stable')
+        top_commenters = commenters.head(5).items()
+    top_commenters_list = [f"{username} ({count})" for username, count in top_commenters]
 
     # First CSV: comments with specified columns in the requested order
-    with open(comments_path, 'w', newline='', encoding='utf-8') as file:
-        fieldnames = ['Username', 'Comment', 'Comment ID', 'Platform', 'Likes', 'Is Reply', 'Parent Comment ID']
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        writer.writeheader()
-        for comment in comments:
-            writer.writerow({
-                'Username': comment.get('Username', 'Anonymous'),
-                'Comment': comment['Comment'],
-                'Comment ID': comment.get('CommentId', ''),
-                'Platform': comment['Platform'],
-                'Likes': comment.get('Likes', 0),
-                'Is Reply': 'Yes' if comment.get('IsReply', False) else 'No',
-                'Parent Comment ID': comment.get('ParentId', '') if comment.get('IsReply', False) else 'Null'
-            })
+    comments_buffer = io.StringIO()
+    frame.to_csv(comments_buffer, columns=COMMENT_COLUMNS, index=False, lineterminator='\r\n')
 
     # Second CSV: sentiment analysis data
-    with open(sentiment_path, 'w', newline='', encoding='utf-8') as file:
-        writer = csv.DictWriter(file, fieldnames=['Comment', 'Sentiment', 'Sentiment Score'])
-        writer.writeheader()
-        for comment in comments:
-            writer.writerow({
-                'Comment': comment['Comment'],
-                'Sentiment': comment.get('Sentiment', 'Neutral'),
-                'Sentiment Score': comment.get('Sentiment_Score', 0.0)
-            })
+    sentiment_buffer = io.StringIO()
+    frame.to_csv(sentiment_buffer, columns=['Comment', 'Sentiment', 'Sentiment Score'],
+                 index=False, lineterminator='\r\n')
 
     # Text file with metadata, sentiment report and top commenters
-    with open(metadata_path, 'w', encoding='utf-8') as file:
-        file.write(f"Metadata for {platform} content:\n")
-        file.write('='*50 + '\n')
-        for key, value in metadata.items():
-            file.write(f"{key}: {value}\n")
-        
-        file.write('\nSentiment Analysis Report:\n')
-        file.write('='*50 + '\n')
-        for key, value in sentiment_report.items():
-            file.write(f"{key}: {value}\n")
-        
-        if top_commenters_list:
-            file.write('\nTop Commenters:\n')
-            file.write('='*50 + '\n')
-            for i, commenter in enumerate(top_commenters_list, 1):
-                file.write(f"{i}. {commenter}\n")
+    metadata_lines = [f"Metadata for {platform} content:", '='*50]
+    metadata_lines.extend(f"{key}: {value}" for key, value in metadata.items())
+    
+    metadata_lines.extend(['', 'Sentiment Analysis Report:', '='*50])
+    metadata_lines.extend(f"{key}: {value}" for key, value in sentiment_report.items())
+    
+    if top_commenters_list:
+        metadata_lines.extend(['', 'Top Commenters:', '='*50])
+        metadata_lines.extend(f"{i}. {commenter}" for i, commenter in enumerate(top_commenters_list, 1))
+    
+    # Write all files concurrently
+    writes = [
+        _write_file(comments_path, comments_buffer.getvalue()),
+        _write_file(sentiment_path, sentiment_buffer.getvalue()),
+        _write_file(metadata_path, '\n'.join(metadata_lines) + '\n')
+    ]
+    
+    # Optional JSON file with the generated insights
+    insights_json = f"{platform.lower()}_insights_{request_id}.json"
+    if insights is not None:
+        writes.append(_write_file(
+            os.path.join(response_dir, insights_json),
+            orjson.dumps(insights, option=orjson.OPT_INDENT_2)
+        ))
+    
+    await asyncio.gather(*writes)
     
     # Create URLs for the files
     base_url = f"/api/files/{response_folder}"
-    return {
+    file_urls = {
         "comments_csv": f"{base_url}/{comments_csv}",
         "sentiment_csv": f"{base_url}/{sentiment_csv}",
         "metadata_txt": f"{base_url}/{metadata_txt}",
         "folder": response_folder
-    }
\ No newline at end of file
+    }
+    if insights is not None:
+        file_urls["insights_json"] = f"{base_url}/{insights_json}"
+    return file_urls
\ No newline at end of file
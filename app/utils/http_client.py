@@ -0,0 +1,5 @@
+import httpx
+
+# Shared async HTTP client so connections are pooled and reused across requests.
+# Closed on application shutdown (see app.main).
+http_client = httpx.AsyncClient(timeout=10.0)
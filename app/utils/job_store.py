@@ -0,0 +1,76 @@
+import os
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+import orjson
+
+# Redis connection URL; when unset, jobs are kept in process memory
+REDIS_URL = os.environ.get('REDIS_URL', '')
+
+# How long job records are kept in Redis, in seconds
+JOB_TTL_SECONDS = int(os.environ.get('JOB_TTL_SECONDS', '3600'))
+
+class JobStore(ABC):
+    """
+    Storage for analysis job status, keyed by request ID
+    """
+    @abstractmethod
+    async def get(self, request_id: str) -> Optional[Dict[str, Any]]:
+        """Return the job record, or None if the job is unknown"""
+
+    @abstractmethod
+    async def set(self, request_id: str, job: Dict[str, Any]) -> None:
+        """Create or replace the job record"""
+
+    async def close(self) -> None:
+        """Release any connections held by the store"""
+
+class InMemoryJobStore(JobStore):
+    """
+    Process-local job store; jobs are only visible to the worker that created them
+    """
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+
+    async def get(self, request_id: str) -> Optional[Dict[str, Any]]:
+        return self._jobs.get(request_id)
+
+    async def set(self, request_id: str, job: Dict[str, Any]) -> None:
+        self._jobs[request_id] = job
+
+class RedisJobStore(JobStore):
+    """
+    Job store shared by all workers through Redis, with expiring records
+    """
+    def __init__(self, url: str, ttl: int = JOB_TTL_SECONDS):
+        """
+        Connect to Redis
+
+        Args:
+            url: Redis connection URL, e.g. redis://localhost:6379/0
+            ttl: Seconds after the last update before a job record expires
+        """
+        # Only needed when Redis is configured
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self.ttl = ttl
+
+    async def get(self, request_id: str) -> Optional[Dict[str, Any]]:
+        raw = await self._redis.get(f"job:{request_id}")
+        return orjson.loads(raw) if raw is not None else None
+
+    async def set(self, request_id: str, job: Dict[str, Any]) -> None:
+        await self._redis.set(f"job:{request_id}", orjson.dumps(job), ex=self.ttl)
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+def create_job_store() -> JobStore:
+    """Use Redis when REDIS_URL is set, otherwise keep jobs in memory"""
+    if REDIS_URL:
+        return RedisJobStore(REDIS_URL)
+    return InMemoryJobStore()
+
+# Shared job store used by the API routes
+job_store = create_job_store()
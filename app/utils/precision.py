@@ -0,0 +1,23 @@
+import os
+
+import torch
+
+# Run the sentiment, ABSA and summarization models through ONNX Runtime, which
+# fuses the transformer ops and skips per-op Python dispatch
+# (requires `optimum[onnxruntime]`)
+USE_ONNX_RUNTIME = os.environ.get('USE_ONNX_RUNTIME', '').lower() in ('1', 'true', 'yes')
+
+def inference_dtype(device: int) -> torch.dtype:
+    """
+    Return the dtype to load model weights in for a pipeline device index
+
+    bfloat16 keeps FP32's exponent range, so it is preferred on GPUs that
+    support it; older GPUs fall back to float16 and the CPU stays in float32.
+    Models load their weights directly in this dtype (with low_cpu_mem_usage),
+    so no FP32 copy is made in RAM.
+    """
+    if device < 0:
+        return torch.float32
+    if torch.cuda.is_bf16_supported():
+        return torch.bfloat16
+    return torch.float16
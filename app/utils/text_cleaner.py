@@ -0,0 +1,13 @@
+import re
+
+# Links carry no sentiment and only cost tokens
+_URL_PATTERN = re.compile(r"https?://\S+")
+
+def normalize_comment_text(text: str) -> str:
+    """
+    Prepare comment text for analysis: drop URLs and collapse whitespace
+
+    Case is preserved because the sentiment and ABSA models are cased;
+    aspect keyword matching lowercases on its own.
+    """
+    return " ".join(_URL_PATTERN.sub(" ", text).split())
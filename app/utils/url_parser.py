@@ -1,44 +1,50 @@
-from urllib.parse import urlparse, parse_qs
+import re
+from functools import lru_cache
+from urllib.parse import urlparse
 from typing import Optional
 
+# Platform for each supported registered domain; subdomains of these match too
+_PLATFORMS = {
+    'instagram.com': 'Instagram',
+    'youtube.com': 'YouTube',
+    'youtu.be': 'YouTube'
+}
+
 def get_platform_from_url(url: str) -> str:
     """Determine platform from URL"""
-    if 'instagram.com' in url:
-        return "Instagram"
-    elif 'youtube.com' in url or 'youtu.be' in url:
-        return "YouTube"
-    else:
-        return "Unknown"
+    labels = (urlparse(url).hostname or '').split('.')
+    
+    # Try the host and then each parent domain, e.g. music.youtube.com -> youtube.com
+    for i in range(len(labels) - 1):
+        platform = _PLATFORMS.get('.'.join(labels[i:]))
+        if platform:
+            return platform
+    return "Unknown"
+
+# Video ID after watch?v=, youtu.be/, /embed/, /v/ or /shorts/
+_YOUTUBE_ID_RE = re.compile(r'(?:[?&]v=|youtu\.be/|/embed/|/v/|/shorts/)([A-Za-z0-9_-]{11})')
+
+# Shortcode after /p/ or /reel/
+_INSTAGRAM_SHORTCODE_RE = re.compile(r'/(?:p|reel)/([A-Za-z0-9_-]+)')
 
+@lru_cache(maxsize=1024)
 def extract_youtube_video_id(url: str) -> Optional[str]:
     """Extract video ID from various YouTube URL formats"""
-    # Handle standard youtube.com URLs
-    if 'youtube.com/watch' in url:
-        parsed_url = urlparse(url)
-        return parse_qs(parsed_url.query).get('v', [None])[0]
-    
-    # Handle youtu.be shortened URLs
-    elif 'youtu.be' in url:
-        parsed_url = urlparse(url)
-        path = parsed_url.path
-        # Remove leading slash if present
-        video_id = path[1:] if path.startswith('/') else path
-        # Handle query parameters
-        return video_id.split('?')[0]
-    
-    return None
+    match = _YOUTUBE_ID_RE.search(url)
+    return match.group(1) if match else None
 
+@lru_cache(maxsize=1024)
 def extract_instagram_shortcode(url: str) -> Optional[str]:
     """Extract shortcode from Instagram URL"""
+    match = _INSTAGRAM_SHORTCODE_RE.search(url)
+    if match:
+        return match.group(1)
+    
+    # Fall back to the last path segment for other URL shapes
     try:
-        if '/p/' in url:
-            shortcode = url.split('/p/')[-1].split('/')[0]
-        elif '/reel/' in url:
-            shortcode = url.split('/reel/')[-1].split('/')[0]
-        else:
-            shortcode = url.split('/')[-2] if url[-1] != '/' else url.split('/')[-3]
+        shortcode = url.split('/')[-2] if url[-1] != '/' else url.split('/')[-3]
         
         # Clean up any query parameters
         return shortcode.split('?')[0]
     except Exception:
-        return None
\ No newline at end of file
+        return None